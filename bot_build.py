@@ -3,6 +3,10 @@ import datetime
 import re
 import os
 import json
+import itertools
+import multiprocessing
+import threading
+import time
 from zoneinfo import ZoneInfo
 
 from dotenv import load_dotenv
@@ -17,6 +21,7 @@ from telegram.ext import (
     Updater,
     CommandHandler,
     MessageHandler,
+    TypeHandler,
     Filters,
     ConversationHandler,
     CallbackContext,
@@ -28,17 +33,37 @@ from telegram.ext import (
 # from oauth2client.service_account import ServiceAccountCredentials
 
 # Імпорт функцій для роботи з Google Sheet (не змінюємо, бо треба зберігати у Sheets)
-from sheets_helper import (
-    get_today_sheet,
-    get_worker_block_header_row,
-    create_worker_block,
-    update_shift_row,
+from sheets_helper import get_spreadsheet
+from sheet_writer import SheetWriter
+from state_store import SqliteStore
+from coordinator import (
+    Coordinator,
+    CoordinatorClient,
+    RemoteSheetWriter,
+    RemoteShiftBoard,
+    partition_for,
 )
+from message_queue import MessageQueue, PRIORITY_INTERACTIVE, PRIORITY_REMINDER, GLOBAL_RATE, GLOBAL_BURST
+from live_location import LiveLocationStore
+from geocoder import ReverseGeocoder
+from dashboard import ShiftBoard, start_dashboard_server
+from profiling import profiler
+from payroll_export import export_payroll, parse_month
 
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 CREDENTIALS_JSON = os.getenv("credentials", "")
+# Comma-separated Telegram user ids allowed to use admin commands (/today, /profile, /export)
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x}
+# Local HTTP dashboard port (disabled if not set)
+DASHBOARD_PORT = os.getenv("DASHBOARD_PORT", "")
+# Number of worker processes handling updates (1 => everything in one process)
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+# How often the coordinator checks that worker processes are alive (seconds)
+WORKER_CHECK_INTERVAL = 10
+# How long /profile off waits for the workers' profiling data (seconds)
+PROFILE_COLLECT_TIMEOUT = 30
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO
@@ -47,6 +72,14 @@ logger = logging.getLogger(__name__)
 
 # Вкажемо шлях до локального файлу зі списком користувачів (наприклад, /data/users.txt)
 USERS_FILE_PATH = os.path.join("/data", "users.txt")
+# Спільний локальний стан (SQLite, WAL) для всіх процесів: реєстрації, активні зміни,
+# дати останніх змін, рядки блоків працівників у місячних аркушах
+STATE_DB_PATH = os.path.join("/data", "state.db")
+# Тека для файлів експорту (/export)
+EXPORT_DIR = os.path.join("/data", "exports")
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "2"))
+# Локальний набір місць для зворотного геокодування (name, lat, lon)
+PLACES_FILE_PATH = os.getenv("PLACES_FILE_PATH", os.path.join("/data", "places.csv"))
 
 # Conversation states
 REG_PHONE, REG_FIO = range(2)
@@ -125,6 +158,15 @@ def save_registered_user(user_id, phone, fio):
     save_local_file(USERS_FILE_PATH, new_content)
 
 
+def persist_registered_user(user_id, phone, fio, context: CallbackContext):
+    """Save to users.txt here, or via the coordinator in multi-process mode (single file writer)."""
+    client = context.bot_data.get("coordinator")
+    if client is None:
+        save_registered_user(user_id, phone, fio)
+    else:
+        client.cast("save_registered_user", user_id, phone, fio)
+
+
 # ======================================================
 # Keyboards and Main Menu
 # ======================================================
@@ -157,17 +199,55 @@ def get_main_menu_reply_keyboard(user_id: int, context: CallbackContext):
 
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=False)
 
+def queue_message(context: CallbackContext, chat_id: int, priority: int = PRIORITY_INTERACTIVE, **kwargs):
+    """
+    Send a message through the rate-limited queue (if running),
+    otherwise fall back to a direct bot.send_message.
+    """
+    message_queue = context.bot_data.get("message_queue")
+    if message_queue is None:
+        context.bot.send_message(chat_id=chat_id, **kwargs)
+    else:
+        message_queue.send_message(chat_id, priority=priority, **kwargs)
+
+def send_reply(update: Update, context: CallbackContext, text: str, **kwargs):
+    """
+    Reply in the update's chat through the queue, so replies share the Telegram
+    limits with reminders and keep their order with queued menus.
+    """
+    queue_message(context, update.effective_chat.id, text=text, **kwargs)
+
 def send_main_menu(user_id: int, context: CallbackContext):
-    context.bot.send_message(
-        chat_id=user_id,
+    queue_message(
+        context,
+        user_id,
         text="Please choose an action:",
         reply_markup=get_main_menu_reply_keyboard(user_id, context)
     )
 
 
+def remember_shift_day(user_id: int, context: CallbackContext) -> None:
+    """Today's row of the worker has shift data (start, check-in or finish of an overnight shift)."""
+    context.bot_data.setdefault("shift_days", {})[user_id] = now_belgium().date().isoformat()
+
+def get_live_locations(context: CallbackContext) -> LiveLocationStore:
+    return context.bot_data.setdefault("live_locations", LiveLocationStore())
+
+def get_shift_board(context: CallbackContext) -> ShiftBoard:
+    return context.bot_data.setdefault("shift_board", ShiftBoard())
+
+def format_coords(context: CallbackContext, latitude: float, longitude: float) -> str:
+    """Return 'lat, lon' with the nearest known place name appended, if any."""
+    coords = f"{latitude}, {longitude}"
+    geocoder = context.bot_data.get("geocoder")
+    place = geocoder.lookup(latitude, longitude) if geocoder else None
+    return f"{coords} ({place})" if place else coords
+
+
 # ======================================================
 # Registration
 # ======================================================
+@profiler.trace()
 def start_command(update: Update, context: CallbackContext) -> int:
     """Triggered by /start – Begin registration or show the main menu."""
     user_id = update.effective_user.id
@@ -176,18 +256,19 @@ def start_command(update: Update, context: CallbackContext) -> int:
         context.bot_data["registered_users"] = load_registered_users()
 
     if user_id in context.bot_data["registered_users"]:
-        update.message.reply_text("You are already registered!")
+        send_reply(update, context, "You are already registered!")
         send_main_menu(user_id, context)
         return ConversationHandler.END
 
     button = KeyboardButton("Share my phone number", request_contact=True)
     reply_markup = ReplyKeyboardMarkup([[button]], one_time_keyboard=True, resize_keyboard=True)
-    update.message.reply_text(
-        "Please enter your Belgian phone number (+32XXXXXXXXX or 0XXXXXXXXX):",
+    send_reply(
+        update, context, "Please enter your Belgian phone number (+32XXXXXXXXX or 0XXXXXXXXX):",
         reply_markup=reply_markup
     )
     return REG_PHONE
 
+@profiler.trace()
 def reg_phone(update: Update, context: CallbackContext) -> int:
     if update.message.contact:
         phone = update.message.contact.phone_number
@@ -196,16 +277,17 @@ def reg_phone(update: Update, context: CallbackContext) -> int:
     phone = phone.replace(" ", "")
 
     if not PHONE_REGEX.match(phone):
-        update.message.reply_text("Invalid format. Please try again in the format +32XXXXXXXXX or 0XXXXXXXXX:")
+        send_reply(update, context, "Invalid format. Please try again in the format +32XXXXXXXXX or 0XXXXXXXXX:")
         return REG_PHONE
 
     context.user_data['phone'] = phone
-    update.message.reply_text("Please enter your full name:", reply_markup=ReplyKeyboardRemove())
+    send_reply(update, context, "Please enter your full name:", reply_markup=ReplyKeyboardRemove())
     return REG_FIO
 
+@profiler.trace()
 def reg_fio(update: Update, context: CallbackContext) -> int:
     context.user_data['fio'] = update.message.text.strip()
-    update.message.reply_text("Registration complete.")
+    send_reply(update, context, "Registration complete.")
 
     user_id = update.effective_user.id
     if "registered_users" not in context.bot_data:
@@ -216,40 +298,42 @@ def reg_fio(update: Update, context: CallbackContext) -> int:
         "fio": context.user_data['fio']
     }
 
-    save_registered_user(user_id, context.user_data['phone'], context.user_data['fio'])
+    persist_registered_user(user_id, context.user_data['phone'], context.user_data['fio'], context)
     send_main_menu(user_id, context)
     return ConversationHandler.END
 
 def cancel(update: Update, context: CallbackContext) -> int:
     """Triggered by /cancel – end conversation and remove keyboard."""
-    update.message.reply_text("Action canceled.", reply_markup=ReplyKeyboardRemove())
+    send_reply(update, context, "Action canceled.", reply_markup=ReplyKeyboardRemove())
     return ConversationHandler.END
 
 
 # ======================================================
 # Start Shift
 # ======================================================
+@profiler.trace()
 def start_work_entry(update: Update, context: CallbackContext) -> int:
     """User clicked 'Start shift'. Ask for location."""
-    update.message.reply_text(
-        "Please send your location to start your workday.",
+    send_reply(
+        update, context, "Please send your location to start your workday.",
         reply_markup=get_location_keyboard()
     )
     return WS_WAITING_FOR_LOCATION
 
+@profiler.trace()
 def ws_receive_location(update: Update, context: CallbackContext) -> int:
     """Receive location to start shift."""
     loc = update.message.location
     if not loc:
-        update.message.reply_text(
-            "Location not received. Please press 'Share location'.",
+        send_reply(
+            update, context, "Location not received. Please press 'Share location'.",
             reply_markup=get_location_keyboard()
         )
         return WS_WAITING_FOR_LOCATION
 
     user_id = update.effective_user.id
     now_time = now_belgium().strftime("%H:%M:%S")
-    start_coords = f"{loc.latitude}, {loc.longitude}"
+    start_coords = format_coords(context, loc.latitude, loc.longitude)
 
     if "registered_users" not in context.bot_data:
         context.bot_data["registered_users"] = load_registered_users()
@@ -260,31 +344,47 @@ def ws_receive_location(update: Update, context: CallbackContext) -> int:
         "phone": reg_data["phone"],
     }
 
-    sheet = get_today_sheet(context)
-    header_row = get_worker_block_header_row(sheet, worker["phone"].lstrip("+"))
-    if header_row is None:
-        all_values = sheet.get_all_values()
-        start_row = len(all_values) + 2
-        _, header_row = create_worker_block(sheet, worker, start_row)
-
     shift_info = {
         "start_time": now_time,
         "start_coords": start_coords,
     }
-    update_shift_row(sheet, header_row, shift_info)
+    try:
+        header_row = context.bot_data["sheet_writer"].record_start(worker, shift_info)
+    except Exception:
+        # Nothing is marked active; sending the location again rewrites the same cells
+        logger.exception("Failed to record shift start for %s", user_id)
+        send_reply(
+            update, context, "Could not record the start of your shift. Please send your location again.",
+            reply_markup=get_location_keyboard()
+        )
+        return WS_WAITING_FOR_LOCATION
+    remember_shift_day(user_id, context)
 
     context.dispatcher.user_data[user_id]["sheet_header_row"] = header_row
     context.dispatcher.user_data[user_id]["shift_start_dt"] = now_belgium()
+    context.dispatcher.user_data[user_id]["intermediate_count"] = 0
+    context.dispatcher.user_data[user_id]["awaiting_intermediate"] = False
+
+    # Live location shared at start => further points arrive as edited_message
+    live_locations = get_live_locations(context)
+    live_locations.clear(user_id)
+    if loc.live_period:
+        live_locations.update(user_id, loc.latitude, loc.longitude)
 
     # Mark shift as active
     active_work = context.bot_data.get("active_work", {})
     active_work[user_id] = True
     context.bot_data["active_work"] = active_work
 
+    get_shift_board(context).start(
+        user_id, worker["fio"], worker["phone"],
+        context.dispatcher.user_data[user_id]["shift_start_dt"]
+    )
+
     # Schedule intermediate location requests (3h, 6h)
     schedule_intermediate_jobs(user_id, context)
 
-    update.message.reply_text("Workday started. Data recorded.", reply_markup=ReplyKeyboardRemove())
+    send_reply(update, context, "Workday started. Data recorded.", reply_markup=ReplyKeyboardRemove())
     send_main_menu(user_id, context)
     return ConversationHandler.END
 
@@ -292,34 +392,43 @@ def ws_receive_location(update: Update, context: CallbackContext) -> int:
 # ======================================================
 # Finish Shift
 # ======================================================
+@profiler.trace()
 def finish_work_entry(update: Update, context: CallbackContext) -> int:
     """User clicked 'Finish shift'."""
     user_id = update.effective_user.id
     context.dispatcher.user_data.setdefault(user_id, {})
     context.dispatcher.user_data[user_id]["finishing_mode"] = True
 
-    update.message.reply_text(
-        "You are finishing your workday. Please share your location.",
+    # Worker is sharing live location => finish with the latest point, no need to ask
+    live_point = get_live_locations(context).latest(user_id)
+    if live_point:
+        context.dispatcher.user_data[user_id]["finish_coords"] = format_coords(context, *live_point)
+        return record_finish(update, context)
+
+    send_reply(
+        update, context, "You are finishing your workday. Please share your location.",
         reply_markup=get_location_keyboard()
     )
     return WE_WAITING_FOR_LOCATION
 
+@profiler.trace()
 def we_receive_location(update: Update, context: CallbackContext) -> int:
     """Receive final location to finish shift."""
     loc = update.message.location
     if not loc:
-        update.message.reply_text(
-            "Location not received. Please press 'Share location'.",
+        send_reply(
+            update, context, "Location not received. Please press 'Share location'.",
             reply_markup=get_location_keyboard()
         )
         return WE_WAITING_FOR_LOCATION
 
     user_id = update.effective_user.id
-    finish_coords = f"{loc.latitude}, {loc.longitude}"
+    finish_coords = format_coords(context, loc.latitude, loc.longitude)
     context.dispatcher.user_data[user_id]["finish_coords"] = finish_coords
 
     return record_finish(update, context)
 
+@profiler.trace()
 def record_finish(update: Update, context: CallbackContext) -> int:
     """Write finishing data to the sheet and reset status."""
     user_id = update.effective_user.id
@@ -327,20 +436,25 @@ def record_finish(update: Update, context: CallbackContext) -> int:
 
     header_row = context.dispatcher.user_data[user_id].get("sheet_header_row")
     if not header_row:
-        update.message.reply_text("Error: current shift data not found.", reply_markup=ReplyKeyboardRemove())
+        # Shift data is lost (e.g. restarted worker process): let the worker start a new shift
+        send_reply(update, context, "Error: current shift data not found.", reply_markup=ReplyKeyboardRemove())
         context.dispatcher.user_data[user_id]["finishing_mode"] = False
+        context.bot_data["active_work"][user_id] = False
+        get_shift_board(context).finish(user_id)
+        send_main_menu(user_id, context)
         return ConversationHandler.END
 
-    sheet = get_today_sheet(context)
-    current_day = now_belgium().day
-    target_row = header_row + current_day
-
-    # Write finish time (H=8) and finish coords (I=9)
-    sheet.update_cell(target_row, 8, finish_time)
-    sheet.update_cell(target_row, 9, context.dispatcher.user_data[user_id].get("finish_coords", ""))
+    # Write finish time (H=8) and finish coords (I=9) in one call
+    context.bot_data["sheet_writer"].update_cells(header_row, 8, [
+        finish_time,
+        context.dispatcher.user_data[user_id].get("finish_coords", ""),
+    ])
+    remember_shift_day(user_id, context)
 
     # Cancel intermediate location jobs
     cancel_intermediate_jobs(user_id, context)
+    get_live_locations(context).clear(user_id)
+    get_shift_board(context).finish(user_id)
 
     # Mark shift as inactive
     active_work = context.bot_data.get("active_work", {})
@@ -349,8 +463,8 @@ def record_finish(update: Update, context: CallbackContext) -> int:
 
     context.dispatcher.user_data[user_id]["finishing_mode"] = False
 
-    update.message.reply_text(
-        "Workday finished. Data saved.",
+    send_reply(
+        update, context, "Workday finished. Data saved.",
         reply_markup=ReplyKeyboardRemove()
     )
     send_main_menu(user_id, context)
@@ -360,13 +474,25 @@ def record_finish(update: Update, context: CallbackContext) -> int:
 # ======================================================
 # Intermediate Location Requests (3h, 6h)
 # ======================================================
+@profiler.trace()
 def intermediate_geo_request(context: CallbackContext):
     """job_queue callback for requesting intermediate location at 3h and 6h."""
     user_id = context.job.context
     active_work = context.bot_data.get("active_work", {})
     if active_work.get(user_id, False):
-        context.bot.send_message(
-            chat_id=user_id,
+        # Worker is sharing live location => write the latest point, no reminder needed
+        live_point = get_live_locations(context).latest(user_id)
+        if live_point:
+            geo_str = format_coords(context, *live_point)
+            if record_intermediate_location(user_id, context, geo_str) is not None:
+                return
+
+        # The answer (even a live location) is this checkpoint's location
+        context.dispatcher.user_data.setdefault(user_id, {})["awaiting_intermediate"] = True
+        queue_message(
+            context,
+            user_id,
+            priority=PRIORITY_REMINDER,
             text="Please send your intermediate location (use 'Share location').",
             reply_markup=get_location_keyboard()
         )
@@ -389,13 +515,63 @@ def cancel_intermediate_jobs(user_id: int, context: CallbackContext):
         context.dispatcher.user_data[user_id]["intermediate_jobs"] = []
 
 
+@profiler.trace()
+def record_intermediate_location(user_id: int, context: CallbackContext, geo_str: str):
+    """
+    Write an intermediate location into the next free column (3h => F, 6h => G).
+    Returns the intermediate number (1 or 2), or None if nothing was written.
+    """
+    user_data = context.dispatcher.user_data.get(user_id, {})
+    intermediate_count = user_data.get("intermediate_count", 0)
+    if intermediate_count >= 2 or "sheet_header_row" not in user_data:
+        return None
+
+    header_row = user_data["sheet_header_row"]
+
+    # col=6 => Промеж 3 часа, col=7 => Промеж 6 часов
+    col = 6 if intermediate_count == 0 else 7
+    context.bot_data["sheet_writer"].update_cells(header_row, col, [geo_str])
+    remember_shift_day(user_id, context)
+    user_data["intermediate_count"] = intermediate_count + 1
+    get_shift_board(context).checkin(user_id, intermediate_count + 1)
+    return intermediate_count + 1
+
+
+# ======================================================
+# Nightly "no shift" fill
+# ======================================================
+@profiler.trace()
+def nightly_no_shift_job(context: CallbackContext):
+    """
+    job_queue callback (end of day): mark D..I with '-' for every registered worker
+    whose row for today has no shift data (shift_days is updated on start, check-ins
+    and finish, so the end of an overnight shift counts too). Uses local state only,
+    then writes all rows in one request.
+    Workers without a block in this month's sheet have no row to fill and are skipped.
+    """
+    today = now_belgium().date().isoformat()
+    shift_days = dict(context.bot_data.get("shift_days", {}).items())
+    active_work = dict(context.bot_data.get("active_work", {}).items())
+
+    phones = [
+        reg_data["phone"]
+        for user_id, reg_data in context.bot_data.get("registered_users", {}).items()
+        if shift_days.get(user_id) != today and not active_work.get(user_id, False)
+    ]
+    context.bot_data["sheet_writer"].fill_no_shift(phones)
+
+
 # ======================================================
 # Default Location Handler (outside main conv)
 # ======================================================
+@profiler.trace()
 def default_location_handler(update: Update, context: CallbackContext) -> None:
     """
     If user sends location outside start/finish steps, it may be a 3h or 6h intermediate location.
     If finishing_mode is True, ignore.
+    Live locations (the first message with live_period and its edited_message
+    updates) are only kept in memory; they are written to the sheet by the
+    3h/6h jobs and at finish.
     """
     user_id = update.effective_user.id
 
@@ -403,6 +579,12 @@ def default_location_handler(update: Update, context: CallbackContext) -> None:
     if not context.bot_data.get("active_work", {}).get(user_id, False):
         return
 
+    loc = update.effective_message.location
+    if loc and (update.edited_message or loc.live_period):
+        get_live_locations(context).update(user_id, loc.latitude, loc.longitude)
+    if update.edited_message:
+        return
+
     user_data = context.dispatcher.user_data.get(user_id, {})
 
     # If user is finishing, ignore
@@ -417,26 +599,24 @@ def default_location_handler(update: Update, context: CallbackContext) -> None:
     if (datetime.datetime.now(ZoneInfo("Europe/Brussels")) - shift_start_dt).total_seconds() < 300:
         return
 
+    # Live location started mid-shift: the 3h/6h checkpoints will use it,
+    # unless it answers a checkpoint reminder
+    awaiting_intermediate = user_data.pop("awaiting_intermediate", False)
+    if loc and loc.live_period and not awaiting_intermediate:
+        send_reply(update, context, "Live location received. It will be recorded at the 3h/6h check-ins and at finish.")
+        return
+
     # If user has already sent 2 intermediate locations, ignore
     intermediate_count = user_data.get("intermediate_count", 0)
     if intermediate_count >= 2:
         return
 
-    loc = update.message.location
     if loc:
-        header_row = user_data["sheet_header_row"]
-        sheet = get_today_sheet(context)
-        current_day = now_belgium().day
-        target_row = header_row + current_day
-
-        # col=6 => Промеж 3 часа, col=7 => Промеж 6 часов
-        col = 6 if intermediate_count == 0 else 7
-        geo_str = f"{loc.latitude}, {loc.longitude}"
-        sheet.update_cell(target_row, col, geo_str)
-        user_data["intermediate_count"] = intermediate_count + 1
-
-        update.message.reply_text(
-            f"Intermediate location {intermediate_count+1} recorded.",
+        geo_str = format_coords(context, loc.latitude, loc.longitude)
+        record_intermediate_location(user_id, context, geo_str)
+
+        send_reply(
+            update, context, f"Intermediate location {intermediate_count+1} recorded.",
             reply_markup=ReplyKeyboardRemove()
         )
         send_main_menu(user_id, context)
@@ -445,29 +625,137 @@ def default_location_handler(update: Update, context: CallbackContext) -> None:
 # ======================================================
 # Other Commands
 # ======================================================
+@profiler.trace()
 def menu_command(update: Update, context: CallbackContext) -> None:
     """Triggered by /menu."""
     send_main_menu(update.message.chat_id, context)
 
+def today_command(update: Update, context: CallbackContext) -> None:
+    """Triggered by /today (admins only) – who is on shift and who missed a check-in."""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    send_reply(update, context, get_shift_board(context).render_text(now_belgium()))
+
+def collect_worker_profiles(context: CallbackContext) -> int:
+    """
+    Multi-process mode: stop profiling in the workers and wait until their stacks
+    are merged into the coordinator's profiler. Returns the number of workers that did not answer.
+    """
+    update_queues = context.bot_data.get("update_queues", [])
+    if not update_queues:
+        return 0
+    profile_merges = context.bot_data["profile_merges"]
+    # Merges of an earlier, timed out collection must not be counted here
+    while profile_merges.acquire(blocking=False):
+        pass
+    collection = next(context.bot_data["profile_collections"])
+    context.bot_data["profile_collection"] = collection
+    for update_queue in update_queues:
+        update_queue.put(("profile_off", collection))
+    deadline = time.monotonic() + PROFILE_COLLECT_TIMEOUT
+    received = 0
+    while received < len(update_queues):
+        if not profile_merges.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            break
+        received += 1
+    context.bot_data["profile_collection"] = None
+    return len(update_queues) - received
+
+def profile_command(update: Update, context: CallbackContext) -> None:
+    """
+    Triggered by /profile (admins only):
+      /profile on [fraction]  – trace a fraction (default 1.0) of updates
+      /profile off            – stop and write a flame-graph (folded stacks) file
+    In multi-process mode the workers are switched too and their stacks are
+    merged into the coordinator's file.
+    """
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+
+    args = context.args or []
+    if args and args[0] == "on":
+        try:
+            sample_rate = float(args[1]) if len(args) > 1 else 1.0
+        except ValueError:
+            send_reply(update, context, "Usage: /profile on [fraction 0..1]")
+            return
+        profiler.enable(sample_rate)
+        for update_queue in context.bot_data.get("update_queues", []):
+            update_queue.put(("profile_on", profiler.sample_rate))
+        send_reply(update, context, f"Profiling enabled for {profiler.sample_rate:.0%} of updates.")
+    elif args and args[0] == "off":
+        missing = collect_worker_profiles(context)
+        file_path = profiler.disable()
+        text = f"Profiling disabled. Output: {file_path or 'nothing recorded'}"
+        if missing:
+            text += f" (no data from {missing} worker(s))"
+        send_reply(update, context, text)
+    else:
+        state = f"on ({profiler.sample_rate:.0%})" if profiler.enabled else "off"
+        send_reply(update, context, f"Profiling is {state}. Usage: /profile on [fraction] | /profile off")
+
+def export_command(update: Update, context: CallbackContext) -> None:
+    """
+    Triggered by /export (admins only):
+      /export YYYY-MM YYYY-MM [csv|xlsx]
+    Streams shift rows of the month range into a file and sends it.
+    """
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+
+    usage = "Usage: /export YYYY-MM YYYY-MM [csv|xlsx]"
+    args = context.args or []
+    fmt = args[2].lower() if len(args) > 2 else "csv"
+    if len(args) < 2 or fmt not in ("csv", "xlsx"):
+        send_reply(update, context, usage)
+        return
+    try:
+        start, end = parse_month(args[0]), parse_month(args[1])
+    except ValueError:
+        send_reply(update, context, usage)
+        return
+
+    send_reply(update, context, "Export started, please wait...")
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    file_path = os.path.join(EXPORT_DIR, f"payroll_{args[0]}_{args[1]}.{fmt}")
+    try:
+        count = export_payroll(get_spreadsheet(), start, end, file_path, fmt, EXPORT_CONCURRENCY)
+    except ValueError as e:
+        send_reply(update, context, str(e))
+        return
+    except Exception as e:
+        logger.exception("Payroll export failed")
+        send_reply(update, context, f"Export failed: {e}")
+        return
+
+    with open(file_path, "rb") as f:
+        update.message.reply_document(f, caption=f"Rows: {count}")
+
 def inactive_shift_button_handler(update: Update, context: CallbackContext) -> None:
     """If 'Shift in progress' is tapped before 1 hour has passed."""
-    update.message.reply_text("Your shift has not reached 1 hour yet. Please wait to finish the shift.")
+    send_reply(update, context, "Your shift has not reached 1 hour yet. Please wait to finish the shift.")
 
 
 # ======================================================
-# Main
+# Setup
 # ======================================================
-def main() -> None:
-    # Remove any existing webhook
-    bot = Bot(token=BOT_TOKEN)
-    bot.delete_webhook()
-
-    updater = Updater(BOT_TOKEN, use_context=True)
-    dp = updater.dispatcher
-
-    dp.bot_data["registered_users"] = load_registered_users()
-    dp.bot_data["active_work"] = {}
+def setup_bot_data(dp, store: SqliteStore) -> None:
+    """Shared state lives in the SQLite store, so every process sees the same data."""
+    dp.bot_data["registered_users"] = store.mapping("registered_users")
+    dp.bot_data["active_work"] = store.mapping("active_work")
+    dp.bot_data["shift_days"] = store.mapping("shift_days")
+    # Build the place index once at startup so lookups never hit disk
+    dp.bot_data["geocoder"] = ReverseGeocoder(PLACES_FILE_PATH)
+
+def reset_state(store: SqliteStore) -> None:
+    """
+    At startup: sync registrations from users.txt and reset active shifts
+    (per-user shift data and 3h/6h jobs do not survive a restart).
+    """
+    store.mapping("registered_users").update(load_registered_users())
+    store.mapping("active_work").clear()
 
+def register_handlers(dp) -> None:
     # Registration
     reg_handler = ConversationHandler(
         entry_points=[CommandHandler('start', start_command)],
@@ -488,7 +776,7 @@ def main() -> None:
         entry_points=[MessageHandler(Filters.regex("^Start shift$"), start_work_entry)],
         states={
             WS_WAITING_FOR_LOCATION: [
-                MessageHandler(Filters.location, ws_receive_location)
+                MessageHandler(Filters.location & Filters.update.message, ws_receive_location)
             ],
         },
         fallbacks=[CommandHandler('cancel', cancel)],
@@ -501,7 +789,7 @@ def main() -> None:
         entry_points=[MessageHandler(Filters.regex("^Finish shift$"), finish_work_entry)],
         states={
             WE_WAITING_FOR_LOCATION: [
-                MessageHandler(Filters.location, we_receive_location)
+                MessageHandler(Filters.location & Filters.update.message, we_receive_location)
             ],
         },
         fallbacks=[CommandHandler('cancel', cancel)],
@@ -509,7 +797,8 @@ def main() -> None:
     )
     dp.add_handler(work_end_handler)
 
-    # Handle location messages outside the main conversation (intermediate updates)
+    # Handle location messages outside the main conversation (intermediate updates,
+    # including live location updates delivered as edited_message)
     dp.add_handler(MessageHandler(Filters.location, default_location_handler), group=1)
 
     # /menu
@@ -518,9 +807,235 @@ def main() -> None:
     # "Shift in progress"
     dp.add_handler(MessageHandler(Filters.regex("^Shift in progress$"), inactive_shift_button_handler))
 
+def register_admin_handlers(dp) -> None:
+    # /today (admins)
+    dp.add_handler(CommandHandler('today', today_command))
+
+    # /profile on|off (admins, may wait for workers => run_async)
+    dp.add_handler(CommandHandler('profile', profile_command, run_async=True))
+
+    # /export YYYY-MM YYYY-MM [csv|xlsx] (admins, long-running => run_async)
+    dp.add_handler(CommandHandler('export', export_command, run_async=True))
+
+def setup_owner(updater: Updater, store: SqliteStore) -> SheetWriter:
+    """
+    Things that exist once: the Sheets writer, the dashboard, the nightly job.
+    Runs in the single process, or in the coordinator in multi-process mode.
+    """
+    dp = updater.dispatcher
+    sheet_writer = SheetWriter(store.mapping("worker_blocks"))
+    dp.bot_data["sheet_writer"] = sheet_writer
+
+    # Live "who is on shift" index for /today and the local HTTP view
+    shift_board = dp.bot_data.setdefault("shift_board", ShiftBoard())
+    if DASHBOARD_PORT:
+        start_dashboard_server(shift_board, int(DASHBOARD_PORT), now_belgium)
+
+    # End of day: fill "no shift" rows for everyone who did not work today
+    updater.job_queue.run_daily(
+        nightly_no_shift_job,
+        datetime.time(23, 55, tzinfo=ZoneInfo("Europe/Brussels"))
+    )
+    return sheet_writer
+
+
+# ======================================================
+# Multi-process mode
+# ======================================================
+def route_update(update: Update, context: CallbackContext) -> None:
+    """Coordinator: pass the update to the worker process that owns the user."""
+    owner = update.effective_user or update.effective_chat
+    if owner is None:
+        return
+    update_queues = context.bot_data["update_queues"]
+    update_queues[partition_for(owner.id, len(update_queues))].put(update.to_dict())
+
+def shared_message_queue(bot, workers: int) -> MessageQueue:
+    """
+    Chats are partitioned, the global Telegram limit (rate and burst) is shared
+    by all workers and the coordinator (admin replies): one share each.
+    """
+    senders = workers + 1
+    return MessageQueue(
+        bot,
+        global_rate=GLOBAL_RATE / senders,
+        global_burst=max(1, GLOBAL_BURST // senders),
+    )
+
+def run_worker(index: int, workers: int, update_queue, request_queue, reply_queue) -> None:
+    """
+    Worker process: handles updates of its own user_ids partition.
+    Shared state is in the SQLite store, Sheets writes go to the coordinator.
+    """
+    updater = Updater(BOT_TOKEN, use_context=True)
+    dp = updater.dispatcher
+    setup_bot_data(dp, SqliteStore(STATE_DB_PATH))
+
+    client = CoordinatorClient(index, request_queue, reply_queue)
+    dp.bot_data["coordinator"] = client
+    dp.bot_data["sheet_writer"] = RemoteSheetWriter(client)
+    dp.bot_data["shift_board"] = RemoteShiftBoard(client)
+
+    message_queue = shared_message_queue(updater.bot, workers)
+    message_queue.start()
+    dp.bot_data["message_queue"] = message_queue
+
+    register_handlers(dp)
+    updater.job_queue.start()
+    dispatcher_thread = threading.Thread(target=dp.start, name="dispatcher", daemon=True)
+    dispatcher_thread.start()
+
+    while True:
+        data = update_queue.get()
+        if data is None:
+            break
+        # Control messages from the coordinator's /profile
+        if isinstance(data, tuple):
+            if data[0] == "profile_on":
+                profiler.enable(data[1])
+            elif data[0] == "profile_off":
+                client.cast("profile_merge", data[1], profiler.collect())
+            continue
+        dp.update_queue.put(Update.de_json(data, updater.bot))
+
+    dp.stop()
+    updater.job_queue.stop()
+    message_queue.stop()
+    client.close()
+
+def release_partition_shifts(index: int, workers: int, context: CallbackContext) -> None:
+    """
+    Coordinator: end the active shifts of a dead worker's partition. Their
+    per-user shift data and 3h/6h jobs were in that process, same as on a restart.
+    """
+    active_work = context.bot_data["active_work"]
+    shift_board = get_shift_board(context)
+    for user_id, active in active_work.items():
+        if active and partition_for(user_id, workers) == index:
+            active_work[user_id] = False
+            shift_board.finish(user_id)
+
+def check_workers(context: CallbackContext) -> None:
+    """job_queue callback (coordinator): restart worker processes that died."""
+    processes = context.bot_data["worker_processes"]
+    for index, process in enumerate(processes):
+        if not process.is_alive():
+            logger.error("Worker %d exited with code %s, restarting it", index, process.exitcode)
+            release_partition_shifts(index, len(processes), context)
+            processes[index] = context.bot_data["spawn_worker"](index)
+            if profiler.enabled:
+                context.bot_data["update_queues"][index].put(("profile_on", profiler.sample_rate))
+
+def run_coordinator(updater: Updater, store: SqliteStore, workers: int) -> None:
+    """
+    Main process in multi-process mode: polls Telegram, routes updates to
+    `workers` processes by user_id, owns Sheets writes, the dashboard and admin commands.
+    """
+    dp = updater.dispatcher
+    sheet_writer = setup_owner(updater, store)
+    shift_board = dp.bot_data["shift_board"]
+
+    ctx = multiprocessing.get_context("spawn")
+    request_queue = ctx.Queue()
+    update_queues = [ctx.Queue() for _ in range(workers)]
+    reply_queues = [ctx.Queue() for _ in range(workers)]
+    dp.bot_data["update_queues"] = update_queues
+
+    profile_merges = threading.Semaphore(0)
+    dp.bot_data["profile_merges"] = profile_merges
+    # Id of the /profile off collection in progress (None => late data is dropped)
+    dp.bot_data["profile_collections"] = itertools.count(1)
+    dp.bot_data["profile_collection"] = None
+
+    def merge_worker_profile(collection, stacks):
+        if collection != dp.bot_data["profile_collection"]:
+            logger.warning("Profiling data of collection %s arrived too late, dropped", collection)
+            return
+        profiler.merge(stacks)
+        profile_merges.release()
+
+    coordinator = Coordinator({
+        "record_start": sheet_writer.record_start,
+        "update_cells": sheet_writer.update_cells,
+        "fill_no_shift": sheet_writer.fill_no_shift,
+        "board_start": shift_board.start,
+        "board_checkin": shift_board.checkin,
+        "board_finish": shift_board.finish,
+        "save_registered_user": save_registered_user,
+        "profile_merge": merge_worker_profile,
+    }, request_queue, reply_queues)
+    coordinator.start()
+    # Coordinator jobs (nightly fill) also write through the coordinator thread
+    dp.bot_data["sheet_writer"] = RemoteSheetWriter(coordinator)
+
+    def spawn_worker(index):
+        process = ctx.Process(
+            target=run_worker,
+            args=(index, workers, update_queues[index], request_queue, reply_queues[index]),
+            name=f"worker-{index}",
+        )
+        process.start()
+        return process
+
+    # A crashed worker is restarted; its partition's queued updates are kept
+    processes = [spawn_worker(index) for index in range(workers)]
+    dp.bot_data["worker_processes"] = processes
+    dp.bot_data["spawn_worker"] = spawn_worker
+    updater.job_queue.run_repeating(check_workers, interval=WORKER_CHECK_INTERVAL, first=WORKER_CHECK_INTERVAL)
+
+    message_queue = shared_message_queue(updater.bot, workers)
+    message_queue.start()
+    dp.bot_data["message_queue"] = message_queue
+
+    # Admin commands are answered here, everything else goes to the workers
+    register_admin_handlers(dp)
+    dp.add_handler(TypeHandler(Update, route_update))
+
+    updater.start_polling(drop_pending_updates=True)
+    updater.idle()
+
+    for update_queue in update_queues:
+        update_queue.put(None)
+    for process in processes:
+        process.join(timeout=30)
+    coordinator.stop()
+    message_queue.stop()
+
+
+# ======================================================
+# Main
+# ======================================================
+def main() -> None:
+    # Remove any existing webhook
+    bot = Bot(token=BOT_TOKEN)
+    bot.delete_webhook()
+
+    updater = Updater(BOT_TOKEN, use_context=True)
+    dp = updater.dispatcher
+
+    os.makedirs(os.path.dirname(STATE_DB_PATH), exist_ok=True)
+    store = SqliteStore(STATE_DB_PATH)
+    reset_state(store)
+    setup_bot_data(dp, store)
+
+    if WORKER_PROCESSES > 1:
+        run_coordinator(updater, store, WORKER_PROCESSES)
+        return
+
+    setup_owner(updater, store)
+
+    # All outgoing messages (replies, menus, 3h/6h reminders) go through the rate-limited queue
+    message_queue = MessageQueue(updater.bot)
+    message_queue.start()
+    dp.bot_data["message_queue"] = message_queue
+
+    register_handlers(dp)
+    register_admin_handlers(dp)
+
     # Start polling
     updater.start_polling(drop_pending_updates=True)
     updater.idle()
+    message_queue.stop()
 
 
 if __name__ == '__main__':
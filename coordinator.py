@@ -0,0 +1,188 @@
+import itertools
+import logging
+import os
+import threading
+import time
+
+from profiling import profiler
+
+logger = logging.getLogger(__name__)
+
+# How long a worker waits for a synchronous coordinator call (e.g. creating a worker block)
+CALL_TIMEOUT = 120
+# A synchronous request still queued after this long is dropped, not executed:
+# the worker would give up on it before the coordinator could finish
+QUEUE_DEADLINE = 60
+
+
+def partition_for(user_id: int, workers: int) -> int:
+    """Index of the worker process that owns `user_id`."""
+    return user_id % workers
+
+
+class Coordinator:
+    """
+    Runs in the main process and executes requests from worker processes
+    one at a time, so it is the single owner of Google Sheets writes.
+
+    Requests are (worker_index, request_id, op, args, deadline, frames).
+    request_id=None means fire-and-forget; otherwise (request_id, result,
+    error, elapsed) is put on the worker's reply queue. Requests picked up
+    after their deadline are dropped. `frames` is the caller's profiler stack:
+    while profiling, the op is traced under it, so Sheets calls made here
+    are attributed to the worker's handler.
+    The coordinator process itself sends requests with `cast`, so its jobs
+    use the same thread.
+    """
+
+    def __init__(self, ops: dict, request_queue, reply_queues):
+        self.ops = ops
+        self.request_queue = request_queue
+        self.reply_queues = reply_queues
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._loop, name="coordinator", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.request_queue.put(None)
+        if self._thread:
+            self._thread.join(timeout=30)
+
+    def cast(self, op: str, *args) -> None:
+        """Fire-and-forget request from the coordinator process itself."""
+        self.request_queue.put((None, None, op, args, None, profiler.current_frames()))
+
+    def _loop(self):
+        while True:
+            request = self.request_queue.get()
+            if request is None:
+                return
+            worker_index, request_id, op, args, deadline, frames = request
+            result = error = None
+            started = time.perf_counter()
+            if deadline is not None and time.time() > deadline:
+                logger.warning("Coordinator op %s expired in the queue, dropped", op)
+                error = f"{op} expired before it was executed"
+            else:
+                try:
+                    result = self._run(op, args, frames)
+                except Exception as e:
+                    logger.exception("Coordinator op %s failed", op)
+                    error = f"{type(e).__name__}: {e}"
+            if request_id is not None:
+                elapsed = time.perf_counter() - started
+                self.reply_queues[worker_index].put((request_id, result, error, elapsed))
+
+    def _run(self, op, args, frames):
+        # Traced only when the caller's update/job was sampled; otherwise the
+        # traced Sheets helpers must not start stacks of their own here
+        if not profiler.enabled or frames is None:
+            with profiler.untraced():
+                return self.ops[op](*args)
+        with profiler.adopt(frames), profiler.span(f"coordinator {op}"):
+            return self.ops[op](*args)
+
+
+class CoordinatorClient:
+    """Used in a worker process to send requests to the coordinator."""
+
+    def __init__(self, worker_index: int, request_queue, reply_queue):
+        self.worker_index = worker_index
+        self.request_queue = request_queue
+        self.reply_queue = reply_queue
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._reader = threading.Thread(target=self._read_replies, name="coordinator_replies", daemon=True)
+        self._reader.start()
+
+    def cast(self, op: str, *args) -> None:
+        """Fire-and-forget request. Requests of one worker are executed in order."""
+        self.request_queue.put((self.worker_index, None, op, args, None, profiler.current_frames()))
+
+    def call(self, op: str, *args, timeout: float = CALL_TIMEOUT):
+        """
+        Request and wait for the result. Coordinator errors are raised as RuntimeError,
+        no answer in `timeout` as TimeoutError. A request not started within
+        QUEUE_DEADLINE is never executed.
+        """
+        event = threading.Event()
+        slot = {"event": event}
+        with self._lock:
+            # pid in the id: a restarted worker never takes a reply meant for its predecessor
+            request_id = (os.getpid(), next(self._counter))
+            self._pending[request_id] = slot
+        deadline = time.time() + min(QUEUE_DEADLINE, timeout)
+        frames = profiler.current_frames()
+        self.request_queue.put((self.worker_index, request_id, op, args, deadline, frames))
+        if frames is None:
+            answered = event.wait(timeout)
+        else:
+            # Waiting time minus the coordinator's own time (traced there under `frames`)
+            with profiler.span(f"coordinator {op}"):
+                answered = event.wait(timeout)
+                if answered:
+                    profiler.add_child_time(slot["elapsed"])
+        if not answered:
+            with self._lock:
+                self._pending.pop(request_id, None)
+            raise TimeoutError(f"Coordinator did not answer {op} in {timeout}s")
+        if slot["error"]:
+            raise RuntimeError(slot["error"])
+        return slot["result"]
+
+    def close(self) -> None:
+        """Stop the reply reader (call once no more requests will be made)."""
+        self.reply_queue.put(None)
+        self._reader.join(timeout=5)
+
+    def _read_replies(self):
+        while True:
+            reply = self.reply_queue.get()
+            if reply is None:
+                return
+            request_id, result, error, elapsed = reply
+            with self._lock:
+                slot = self._pending.pop(request_id, None)
+            if slot is not None:
+                slot["result"] = result
+                slot["error"] = error
+                slot["elapsed"] = elapsed
+                slot["event"].set()
+
+
+class RemoteSheetWriter:
+    """
+    SheetWriter API whose writes are executed on the coordinator thread.
+    `client` is a CoordinatorClient (worker process) or the Coordinator itself.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def record_start(self, worker: dict, shift_info: dict) -> int:
+        return self.client.call("record_start", worker, shift_info)
+
+    def update_cells(self, header_row: int, first_col: int, values: list) -> None:
+        self.client.cast("update_cells", header_row, first_col, values)
+
+    def fill_no_shift(self, phones: list) -> None:
+        self.client.cast("fill_no_shift", phones)
+
+
+class RemoteShiftBoard:
+    """ShiftBoard updates from a worker process, applied to the coordinator's board."""
+
+    def __init__(self, client: CoordinatorClient):
+        self.client = client
+
+    def start(self, user_id, fio, phone, start_dt) -> None:
+        self.client.cast("board_start", user_id, fio, phone, start_dt)
+
+    def checkin(self, user_id, count) -> None:
+        self.client.cast("board_checkin", user_id, count)
+
+    def finish(self, user_id) -> None:
+        self.client.cast("board_finish", user_id)
@@ -0,0 +1,115 @@
+import datetime
+import html
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Check-in points (seconds after shift start) and how late a check-in may be
+CHECKPOINTS = (3 * 3600, 6 * 3600)
+CHECKIN_GRACE = 30 * 60
+
+
+class ShiftBoard:
+    """
+    In-memory index of workers currently on shift.
+
+    Updated on every start / intermediate / finish event, so rendering is
+    O(active workers) and never reads the sheet.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}
+
+    def start(self, user_id: int, fio: str, phone: str, start_dt: datetime.datetime) -> None:
+        with self._lock:
+            self._active[user_id] = {
+                "fio": fio,
+                "phone": phone,
+                "start_dt": start_dt,
+                "checkins": 0,
+            }
+
+    def checkin(self, user_id: int, count: int) -> None:
+        with self._lock:
+            entry = self._active.get(user_id)
+            if entry is not None:
+                entry["checkins"] = count
+
+    def finish(self, user_id: int) -> None:
+        with self._lock:
+            self._active.pop(user_id, None)
+
+    def snapshot(self, now: datetime.datetime):
+        """
+        Return a list of dicts (fio, phone, start_dt, checkins, missed) sorted by start time.
+        `missed` lists the check-ins (e.g. "3h") that are overdue.
+        """
+        with self._lock:
+            entries = [dict(entry) for entry in self._active.values()]
+
+        for entry in entries:
+            elapsed = (now - entry["start_dt"]).total_seconds()
+            entry["missed"] = [
+                f"{checkpoint // 3600}h"
+                for i, checkpoint in enumerate(CHECKPOINTS)
+                if elapsed >= checkpoint + CHECKIN_GRACE and entry["checkins"] <= i
+            ]
+        entries.sort(key=lambda e: e["start_dt"])
+        return entries
+
+    def render_text(self, now: datetime.datetime) -> str:
+        entries = self.snapshot(now)
+        if not entries:
+            return "Nobody is on shift right now."
+        lines = [f"On shift: {len(entries)}"]
+        for entry in entries:
+            line = f"{entry['fio']} ({entry['phone']}) since {entry['start_dt'].strftime('%H:%M')}"
+            if entry["missed"]:
+                line += f" - missed {', '.join(entry['missed'])}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def render_html(self, now: datetime.datetime) -> str:
+        rows = []
+        for entry in self.snapshot(now):
+            rows.append(
+                "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>".format(
+                    html.escape(entry["fio"]),
+                    html.escape(entry["phone"]),
+                    entry["start_dt"].strftime("%H:%M"),
+                    html.escape(", ".join(entry["missed"]) or "-"),
+                )
+            )
+        return (
+            "<html><head><meta charset='utf-8'><meta http-equiv='refresh' content='60'>"
+            "<title>Today</title></head><body>"
+            f"<h3>On shift: {len(rows)} ({now.strftime('%d.%m %H:%M')})</h3>"
+            "<table border='1' cellpadding='4'>"
+            "<tr><th>ФИО</th><th>Номер телефона</th><th>Начало</th><th>Пропущено</th></tr>"
+            + "".join(rows)
+            + "</table></body></html>"
+        )
+
+
+def start_dashboard_server(board: ShiftBoard, port: int, now_func, host: str = "127.0.0.1"):
+    """Serve board.render_html on http://host:port/ from a daemon thread."""
+
+    class DashboardHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = board.render_html(now_func()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("dashboard: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), DashboardHandler)
+    threading.Thread(target=server.serve_forever, name="dashboard", daemon=True).start()
+    logger.info("Dashboard available at http://%s:%d/", host, port)
+    return server
@@ -0,0 +1,115 @@
+import csv
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Cache key precision: 3 decimals ~ 100 m
+ROUND_DIGITS = 3
+CACHE_SIZE = 4096
+# Farther than this from any known place => no name
+MAX_DISTANCE_KM = 25.0
+KM_PER_DEGREE = 111.32
+
+
+def _project(lat: float, lon: float):
+    """Equirectangular projection in km, good enough for nearest-place lookups."""
+    return lon * KM_PER_DEGREE * math.cos(math.radians(lat)), lat * KM_PER_DEGREE
+
+
+def _build_kdtree(points, depth=0):
+    """
+    points: list of (x, y, name). Returns nested tuples
+    (point, axis, left, right) or None.
+    """
+    if not points:
+        return None
+    axis = depth % 2
+    points.sort(key=lambda p: p[axis])
+    median = len(points) // 2
+    return (
+        points[median],
+        axis,
+        _build_kdtree(points[:median], depth + 1),
+        _build_kdtree(points[median + 1:], depth + 1),
+    )
+
+
+def _nearest(node, x, y, best=None):
+    """Return (squared_distance, point) of the nearest point in the tree."""
+    if node is None:
+        return best
+    point, axis, left, right = node
+    dist = (point[0] - x) ** 2 + (point[1] - y) ** 2
+    if best is None or dist < best[0]:
+        best = (dist, point)
+
+    diff = (x, y)[axis] - point[axis]
+    near, far = (left, right) if diff < 0 else (right, left)
+    best = _nearest(near, x, y, best)
+    if diff * diff < best[0]:
+        best = _nearest(far, x, y, best)
+    return best
+
+
+def load_places(file_path: str):
+    """
+    Read places from a local CSV file with columns: name, lat, lon
+    (header row optional). Returns a list of (x, y, name).
+    """
+    places = []
+    if not os.path.exists(file_path):
+        return places
+    with open(file_path, "r", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                continue
+            try:
+                lat = float(row[1])
+                lon = float(row[2])
+            except ValueError:
+                continue  # header or broken line
+            x, y = _project(lat, lon)
+            places.append((x, y, row[0].strip()))
+    return places
+
+
+class ReverseGeocoder:
+    """
+    Offline reverse geocoding: nearest place from a local dataset via a k-d tree,
+    with a bounded LRU cache keyed by rounded coordinates. No network calls.
+    """
+
+    def __init__(self, places_path: str, cache_size: int = CACHE_SIZE):
+        places = load_places(places_path)
+        self._tree = _build_kdtree(places)
+        if places:
+            logger.info("Reverse geocoder: %d places loaded from %s", len(places), places_path)
+        else:
+            logger.info("Reverse geocoder: no places at %s, place names disabled", places_path)
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def lookup(self, lat: float, lon: float):
+        """Return the nearest place name, or None if unknown / too far away."""
+        if self._tree is None:
+            return None
+        key = (round(lat, ROUND_DIGITS), round(lon, ROUND_DIGITS))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        x, y = _project(*key)
+        dist_sq, point = _nearest(self._tree, x, y)
+        name = point[2] if dist_sq <= MAX_DISTANCE_KM ** 2 else None
+
+        with self._lock:
+            self._cache[key] = name
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return name
@@ -0,0 +1,37 @@
+import threading
+import time
+
+# A live point older than this is not trusted for a checkpoint
+MAX_POINT_AGE = 15 * 60
+
+
+class LiveLocationStore:
+    """
+    In-memory live locations per worker.
+
+    Every live-location update only replaces the worker's latest point, so a
+    stream of updates costs O(1) memory per worker. Nothing here touches
+    Google Sheets: the bot writes the latest point at the 3h/6h checkpoints
+    and at finish.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = {}
+
+    def update(self, user_id: int, latitude: float, longitude: float, ts: float = None) -> None:
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            self._latest[user_id] = (ts, latitude, longitude)
+
+    def latest(self, user_id: int, max_age: float = MAX_POINT_AGE):
+        """Return (latitude, longitude) of the latest fresh point, or None."""
+        with self._lock:
+            point = self._latest.get(user_id)
+        if point is None or time.time() - point[0] > max_age:
+            return None
+        return point[1], point[2]
+
+    def clear(self, user_id: int) -> None:
+        with self._lock:
+            self._latest.pop(user_id, None)
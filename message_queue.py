@@ -0,0 +1,192 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from telegram.error import RetryAfter, TimedOut, NetworkError
+
+logger = logging.getLogger(__name__)
+
+# Priorities: smaller value => sent earlier
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REMINDER = 10
+
+# Telegram limits: ~30 messages/sec for the whole bot, ~1 message/sec per chat
+GLOBAL_RATE = 30.0
+GLOBAL_BURST = 30
+CHAT_RATE = 1.0
+CHAT_BURST = 3
+
+MAX_RETRIES = 3
+# Parallel bot.send_message calls, so a burst is limited by the buckets and not by HTTP latency
+SENDER_THREADS = 4
+# RetryAfter for two different chats within this window => bot-wide flood limit
+GLOBAL_FLOOD_WINDOW = 1.0
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` stored."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0.0 if available right now)."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+    def block(self, now: float, seconds: float) -> None:
+        """Empty the bucket so that the next token appears only after `seconds`."""
+        self.updated = now
+        self.tokens = 1 - seconds * self.rate
+
+
+class MessageQueue:
+    """
+    Outgoing queue for bot.send_message with global and per-chat token buckets.
+
+    Messages are ordered by (priority, arrival). A message whose chat bucket is
+    empty does not block messages for other chats, so a burst of reminders for
+    many workers is drained at the global rate by `senders` threads. At most one
+    message per chat is being sent at a time. On RetryAfter the affected chat
+    is paused and the message re-queued with its original position, so the
+    order of messages within a chat is kept. The whole bot is paused only when
+    several chats hit the flood limit at once (bot-wide flood).
+    """
+
+    def __init__(self, bot, global_rate=GLOBAL_RATE, global_burst=GLOBAL_BURST,
+                 chat_rate=CHAT_RATE, chat_burst=CHAT_BURST, senders=SENDER_THREADS):
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self.senders = senders
+        self._threads = []
+        self._in_flight = set()  # chat_ids with a send in progress
+        self._last_flood = None  # (chat_id, monotonic time) of the last RetryAfter
+
+    def start(self) -> None:
+        self._running = True
+        for n in range(self.senders):
+            thread = threading.Thread(target=self._loop, name=f"message_queue_{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def send_message(self, chat_id: int, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> None:
+        """Queue a bot.send_message call. Returns immediately."""
+        self._push((priority, next(self._counter), chat_id, kwargs, 0))
+
+    def _push(self, item):
+        with self._cond:
+            heapq.heappush(self._heap, item)
+            self._cond.notify()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _next_ready(self):
+        """
+        Pop the best message whose chat has a token and no send in progress.
+        Returns (item, 0.0) or (None, seconds_to_wait); seconds_to_wait is None
+        when only a finished send can make a message ready. Must be called with
+        self._cond held.
+        """
+        now = time.monotonic()
+        wait = self.global_bucket.wait_time(now)
+        if wait > 0:
+            return None, wait
+
+        deferred = []
+        item = None
+        wait = None
+        while self._heap:
+            candidate = heapq.heappop(self._heap)
+            if candidate[2] in self._in_flight:
+                deferred.append(candidate)
+                continue
+            chat_wait = self._chat_bucket(candidate[2]).wait_time(now)
+            if chat_wait == 0.0:
+                item = candidate
+                break
+            deferred.append(candidate)
+            wait = chat_wait if wait is None else min(wait, chat_wait)
+        for candidate in deferred:
+            heapq.heappush(self._heap, candidate)
+
+        if item is None:
+            return None, wait
+        self.global_bucket.consume()
+        self._chat_bucket(item[2]).consume()
+        self._in_flight.add(item[2])
+        return item, 0.0
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._heap:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                item, wait = self._next_ready()
+                if item is None:
+                    self._cond.wait(timeout=wait)
+                    continue
+            try:
+                self._deliver(item)
+            finally:
+                with self._cond:
+                    self._in_flight.discard(item[2])
+                    self._cond.notify()
+
+    def _deliver(self, item):
+        priority, seq, chat_id, kwargs, attempt = item
+        try:
+            self.bot.send_message(chat_id=chat_id, **kwargs)
+        except RetryAfter as e:
+            logger.warning("Flood limit for chat %s, retry in %.1fs", chat_id, e.retry_after)
+            with self._cond:
+                now = time.monotonic()
+                self._chat_bucket(chat_id).block(now, e.retry_after)
+                last = self._last_flood
+                if last and last[0] != chat_id and now - last[1] <= GLOBAL_FLOOD_WINDOW:
+                    self.global_bucket.block(now, e.retry_after)
+                self._last_flood = (chat_id, now)
+            # Same seq => stays ahead of later messages for this chat
+            self._push(item)
+        except (TimedOut, NetworkError) as e:
+            if attempt + 1 < MAX_RETRIES:
+                self._push((priority, seq, chat_id, kwargs, attempt + 1))
+            else:
+                logger.error("Failed to send message to %s: %s", chat_id, e)
+        except Exception as e:
+            logger.error("Failed to send message to %s: %s", chat_id, e)
@@ -0,0 +1,167 @@
+import collections
+import csv
+import datetime
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from zoneinfo import ZoneInfo
+
+import gspread
+
+from sheets_helper import MONTH_NAMES
+
+logger = logging.getLogger(__name__)
+
+# At most this many month worksheets are downloaded at once
+DEFAULT_CONCURRENCY = 2
+
+EXPORT_HEADERS = [
+    "Месяц", "Дата", "ФИО", "Номер телефона",
+    "Время начала", "Координаты начала",
+    "Промеж 3 часа", "Промеж 6 часов",
+    "Время окончания", "Координаты конец",
+]
+
+
+def parse_month(value: str):
+    """'2026-03' -> (2026, 3). Raises ValueError on bad input."""
+    year, month = value.strip().split("-")
+    year, month = int(year), int(month)
+    if not 1 <= month <= 12:
+        raise ValueError(f"Invalid month: {value}")
+    return year, month
+
+
+def last_12_months(now: datetime.datetime = None):
+    """(first, last) (year, month) of the 12 months ending with the current month."""
+    now = now or datetime.datetime.now(ZoneInfo("Europe/Brussels"))
+    year, month = now.year, now.month
+    first = (year - 1, month + 1) if month < 12 else (year, 1)
+    return first, (year, month)
+
+
+def iter_months(start, end):
+    """Yield (year, month) from start to end inclusive."""
+    year, month = start
+    while (year, month) <= end:
+        yield year, month
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+
+def fetch_month_values(spreadsheet, month: int):
+    """All values of the month worksheet (one API call), or [] if there is no such worksheet."""
+    try:
+        return spreadsheet.worksheet(MONTH_NAMES[month]).get_all_values()
+    except gspread.exceptions.WorksheetNotFound:
+        return []
+
+
+def iter_block_rows(values, year: int, month: int, last_day: int = None):
+    """
+    Parse worker blocks (layout of create_worker_block) from a month's values.
+    Yields one export row per day that has any shift data (not empty / not '-').
+    Days after `last_day` (if given) are skipped.
+    """
+    month_label = f"{MONTH_NAMES[month]} {year}"
+    fio = phone = None
+    in_block = False
+    for row in values:
+        row = row + [""] * (10 - len(row))
+        if row[1] == "ФИО":
+            in_block = True
+            fio = phone = None
+            continue
+        if not in_block:
+            continue
+        date = row[9]
+        if not date:
+            in_block = False
+            continue
+        # ФИО / phone are only in the first (merged) row of the block
+        if fio is None:
+            fio, phone = row[1], row[2]
+        if last_day is not None and int(date.split(".")[0]) > last_day:
+            continue
+        shift = row[3:9]
+        if any(value not in ("", "-") for value in shift):
+            yield [month_label, f"{date}.{year}", fio, phone] + shift
+
+
+def iter_export_rows(spreadsheet, start, end, concurrency: int = DEFAULT_CONCURRENCY,
+                     today: datetime.date = None):
+    """
+    Stream export rows for the month range, in month order.
+    Months are fetched in a thread pool with at most `concurrency` downloads
+    in flight; a month's values are dropped as soon as its rows are yielded.
+    In the current month only days up to `today` are exported.
+    """
+    today = today or datetime.datetime.now(ZoneInfo("Europe/Brussels")).date()
+    months = iter_months(start, end)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        def submit(year, month):
+            return year, month, pool.submit(fetch_month_values, spreadsheet, month)
+
+        pending = collections.deque(submit(y, m) for y, m in itertools.islice(months, concurrency))
+        while pending:
+            year, month, future = pending.popleft()
+            values = future.result()
+            for next_year, next_month in itertools.islice(months, 1):
+                pending.append(submit(next_year, next_month))
+            last_day = today.day if (year, month) == (today.year, today.month) else None
+            yield from iter_block_rows(values, year, month, last_day)
+            del values
+
+
+def write_csv(rows, file_path: str) -> int:
+    count = 0
+    with open(file_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_HEADERS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_xlsx(rows, file_path: str) -> int:
+    # write_only mode streams rows to disk instead of building the sheet in memory
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Payroll")
+    worksheet.append(EXPORT_HEADERS)
+    count = 0
+    for row in rows:
+        worksheet.append(row)
+        count += 1
+    workbook.save(file_path)
+    return count
+
+
+def export_payroll(spreadsheet, start, end, file_path: str, fmt: str = "csv",
+                   concurrency: int = DEFAULT_CONCURRENCY) -> int:
+    """
+    Export shift rows for months start..end (inclusive, (year, month) tuples)
+    to `file_path` as CSV or XLSX. Returns the number of rows written.
+
+    Worksheets are named by month only (MONTH_NAMES) and are reused every
+    year, so only the 12 months ending with the current month can be
+    exported. A reused worker block keeps last year's values in the days not
+    written since: days after today in the current month are skipped, older
+    days of a block are exported as they are in the sheet.
+    """
+    if start > end:
+        raise ValueError("Start month is after end month.")
+    first, last = last_12_months()
+    if start < first or end > last:
+        raise ValueError(
+            f"Only months from {first[0]}-{first[1]:02d} to {last[0]}-{last[1]:02d} can be exported."
+        )
+
+    rows = iter_export_rows(spreadsheet, start, end, concurrency)
+    writer = write_xlsx if fmt == "xlsx" else write_csv
+    count = writer(rows, file_path)
+    logger.info("Payroll export %s..%s: %d rows -> %s", start, end, count, file_path)
+    return count
@@ -0,0 +1,214 @@
+import collections
+import datetime
+import functools
+import os
+import random
+import re
+import threading
+import time
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("/data", "profiles"))
+
+
+class Profiler:
+    """
+    On-demand tracing of handlers and the Sheets calls they make.
+
+    While enabled, a `sample_rate` fraction of top-level calls (updates, jobs)
+    is traced. Self time of every frame is accumulated per stack and written in
+    the "folded stacks" format (`a;b;c <microseconds>`) understood by
+    flamegraph.pl, speedscope, etc. While disabled, a traced function costs one
+    attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.started_at = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stacks = collections.Counter()
+
+    def enable(self, sample_rate: float = 1.0) -> None:
+        with self._lock:
+            self._stacks.clear()
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.started_at = datetime.datetime.now()
+        self.enabled = True
+
+    def disable(self, directory: str = PROFILE_DIR):
+        """Stop tracing and write collected stacks. Returns the file path (or None if empty)."""
+        self.enabled = False
+        return self.dump(directory)
+
+    def collect(self) -> dict:
+        """Stop tracing and return (and clear) the collected stacks, e.g. to send to another process."""
+        self.enabled = False
+        with self._lock:
+            stacks = dict(self._stacks)
+            self._stacks.clear()
+        return stacks
+
+    def merge(self, stacks: dict) -> None:
+        """Add stacks collected by another process."""
+        with self._lock:
+            self._stacks.update(stacks)
+
+    def dump(self, directory: str = PROFILE_DIR):
+        with self._lock:
+            stacks = sorted(self._stacks.items())
+        if not stacks:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        stamp = (self.started_at or datetime.datetime.now()).strftime("%Y%m%d-%H%M%S")
+        file_path = os.path.join(directory, f"profile-{stamp}.folded")
+        with open(file_path, "w", encoding="utf-8") as f:
+            for stack, micros in stacks:
+                f.write(f"{stack} {micros}\n")
+        return file_path
+
+    def trace(self, name: str = None):
+        """Decorator: record time spent in the function as a frame called `name`."""
+        def decorator(func):
+            frame_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.span(frame_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def span(self, name: str):
+        """Context manager: record time spent in the block as a frame called `name`."""
+        return _Span(self, name)
+
+    def current_frames(self):
+        """Frame names of the current thread's traced stack, or None if not traced."""
+        if not self.enabled:
+            return None
+        stack = getattr(self._local, "stack", None)
+        return tuple(frame[0] for frame in stack) if stack else None
+
+    def adopt(self, frames):
+        """
+        Context manager: trace the block as if called under `frames` (from
+        current_frames() in another process). The adopted frames themselves
+        get no time here; the caller's process records their own time.
+        """
+        return _Adopt(self, frames)
+
+    def untraced(self):
+        """Context manager: traced calls inside the block start no stacks on this thread."""
+        return _Untraced(self)
+
+    def add_child_time(self, seconds: float) -> None:
+        """Count `seconds` as spent in children of the current frame (recorded elsewhere)."""
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            stack[-1][2] += seconds
+
+    def _enter(self, name):
+        local = self._local
+        # Inside a top-level call that was not sampled
+        skip = getattr(local, "skip", 0)
+        if skip:
+            local.skip = skip + 1
+            return False
+        stack = getattr(local, "stack", None)
+        if stack is None:
+            # Top-level call: decide whether this one is sampled
+            if random.random() >= self.sample_rate:
+                local.skip = 1
+                return False
+            stack = local.stack = []
+        stack.append([name, time.perf_counter(), 0.0])
+        return True
+
+    def _exit(self, sampled):
+        if not sampled:
+            self._local.skip -= 1
+            return
+        stack = self._local.stack
+        name, started, child_time = stack[-1]
+        elapsed = time.perf_counter() - started
+        key = ";".join(frame[0] for frame in stack)
+        stack.pop()
+        with self._lock:
+            self._stacks[key] += int((elapsed - child_time) * 1_000_000)
+        if stack:
+            stack[-1][2] += elapsed
+        else:
+            self._local.stack = None
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "sampled")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.sampled = self.profiler._enter(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._exit(self.sampled)
+        return False
+
+
+class _Adopt:
+    __slots__ = ("profiler", "frames", "active")
+
+    def __init__(self, profiler, frames):
+        self.profiler = profiler
+        self.frames = frames
+
+    def __enter__(self):
+        local = self.profiler._local
+        self.active = bool(
+            self.frames and self.profiler.enabled
+            and getattr(local, "stack", None) is None and not getattr(local, "skip", 0)
+        )
+        if self.active:
+            local.stack = [[name, None, 0.0] for name in self.frames]
+        return self
+
+    def __exit__(self, *exc):
+        if self.active:
+            self.profiler._local.stack = None
+        return False
+
+
+class _Untraced:
+    __slots__ = ("profiler",)
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    def __enter__(self):
+        # Same as being inside a top-level call that was not sampled
+        local = self.profiler._local
+        local.skip = getattr(local, "skip", 0) + 1
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._local.skip -= 1
+        return False
+
+
+def sheets_call_label(method: str, endpoint: str) -> str:
+    """Short frame name for a Sheets/Drive API request, e.g. 'sheets PUT values'."""
+    path = endpoint.split("?", 1)[0]
+    match = re.search(r"/spreadsheets/[^/:]+(.*)$", path)
+    if not match:
+        return f"drive {method.upper()}"
+    # Ranges are URL-quoted, so only the trailing ':append' / ':clear' etc. stays
+    rest = re.sub(r"/values/[^:]+", "/values", match.group(1)).lstrip("/:")
+    return f"sheets {method.upper()} {rest or 'spreadsheet'}"
+
+
+profiler = Profiler()
@@ -0,0 +1,68 @@
+import datetime
+import logging
+from zoneinfo import ZoneInfo
+
+from sheets_helper import (
+    get_today_sheet,
+    get_worker_block_header_row,
+    create_worker_block,
+    update_shift_row,
+    update_day_cells,
+    mark_no_shift_rows,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def month_key(now: datetime.datetime = None) -> str:
+    now = now or datetime.datetime.now(ZoneInfo("Europe/Brussels"))
+    return f"{now.year}-{now.month:02d}"
+
+
+class SheetWriter:
+    """
+    All Google Sheets writes made by the bot handlers.
+
+    In multi-process mode only the coordinator owns a SheetWriter; worker
+    processes use coordinator.RemoteSheetWriter with the same methods.
+    `worker_blocks` maps "YYYY-MM/phone" to the block header row.
+    """
+
+    def __init__(self, worker_blocks):
+        self.worker_blocks = worker_blocks
+
+    def record_start(self, worker: dict, shift_info: dict) -> int:
+        """Find (or create) the worker's block, write start data. Returns header_row."""
+        sheet = get_today_sheet()
+        phone = worker["phone"].lstrip("+")
+        header_row = get_worker_block_header_row(sheet, phone)
+        if header_row is None:
+            all_values = sheet.get_all_values()
+            start_row = len(all_values) + 2
+            _, header_row = create_worker_block(sheet, worker, start_row)
+
+        update_shift_row(sheet, header_row, shift_info)
+        self.remember_block(phone, header_row)
+        return header_row
+
+    def update_cells(self, header_row: int, first_col: int, values: list) -> None:
+        update_day_cells(get_today_sheet(), header_row, first_col, values)
+
+    def fill_no_shift(self, phones: list) -> None:
+        """Mark today's row D..I with '-' for the given phones (one request)."""
+        current_month = month_key()
+        header_rows = []
+        for phone in phones:
+            header_row = self.worker_blocks.get(f"{current_month}/{phone.lstrip('+')}")
+            if header_row is not None:
+                header_rows.append(header_row)
+        if header_rows:
+            mark_no_shift_rows(get_today_sheet(), header_rows)
+        logger.info("No-shift rows filled for %d workers", len(header_rows))
+
+    def remember_block(self, phone: str, header_row: int) -> None:
+        current_month = month_key()
+        # Rows of previous months are not needed anymore
+        for key in [key for key in self.worker_blocks if not key.startswith(current_month + "/")]:
+            self.worker_blocks.pop(key, None)
+        self.worker_blocks[f"{current_month}/{phone}"] = header_row
@@ -12,6 +12,8 @@ from gspread_formatting import (
     format_cell_range,
 )
 
+from profiling import profiler, sheets_call_label
+
 # Russian month names
 MONTH_NAMES = {
     1: "Январь",
@@ -28,6 +30,15 @@ MONTH_NAMES = {
     12: "Декабрь"
 }
 
+class ProfiledClient(gspread.Client):
+    """gspread client that reports every API request to the profiler (when enabled)."""
+
+    def request(self, method, endpoint, *args, **kwargs):
+        if not profiler.enabled:
+            return super().request(method, endpoint, *args, **kwargs)
+        with profiler.span(sheets_call_label(method, endpoint)):
+            return super().request(method, endpoint, *args, **kwargs)
+
 def get_gspread_client():
     CREDENTIALS_JSON = os.getenv("credentials", "")
     if not CREDENTIALS_JSON:
@@ -42,17 +53,22 @@ def get_gspread_client():
         "https://www.googleapis.com/auth/drive",
     ]
     creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    client = gspread.authorize(creds)
+    client = gspread.authorize(creds, client_factory=ProfiledClient)
     return client
 
+def get_spreadsheet():
+    """Opens the Google Spreadsheet by ID."""
+    client = get_gspread_client()
+    # Replace "1FojL9Buaw2MxE1V9zFpeXYwM75ym1MLHeIq44OFn_H4" with your actual spreadsheetId if needed
+    return client.open_by_key("1FojL9Buaw2MxE1V9zFpeXYwM75ym1MLHeIq44OFn_H4")
+
+@profiler.trace()
 def get_month_sheet():
     """
     Opens the Google Spreadsheet by ID.
     If a worksheet for the current month (in Russian) doesn't exist, create it.
     """
-    client = get_gspread_client()
-    # Replace "1FojL9Buaw2MxE1V9zFpeXYwM75ym1MLHeIq44OFn_H4" with your actual spreadsheetId if needed
-    spreadsheet = client.open_by_key("1FojL9Buaw2MxE1V9zFpeXYwM75ym1MLHeIq44OFn_H4")
+    spreadsheet = get_spreadsheet()
 
     now = datetime.datetime.now(ZoneInfo("Europe/Brussels"))
     month_name = MONTH_NAMES.get(now.month, "Unknown")
@@ -75,6 +91,7 @@ def get_days_in_month():
 def merge_cells(sheet, range_str):
     sheet.merge_cells(range_str)
 
+@profiler.trace()
 def get_worker_block_header_row(sheet, phone):
     """
     Find the cell containing the phone number (without +) in the sheet.
@@ -90,6 +107,7 @@ def get_worker_block_header_row(sheet, phone):
     except Exception:
         return None
 
+@profiler.trace()
 def create_worker_block(sheet, worker, start_row):
     """
     Create a block of rows in the sheet for the worker:
@@ -288,6 +306,7 @@ def create_worker_block(sheet, worker, start_row):
     return next_free_row, header_row
 
 
+@profiler.trace()
 def update_shift_row(sheet, header_row, shift_info):
     """
     Update start-of-shift data (or mark no shift) for the current day.
@@ -304,10 +323,39 @@ def update_shift_row(sheet, header_row, shift_info):
     # If we want to mark no shift
     if shift_info.get("no_shift", False):
         # Fill columns D..I with "-"
-        for col in range(4, 10):
-            sheet.update_cell(target_row, col, "-")
+        sheet.update(f"D{target_row}:I{target_row}", [["-"] * 6], raw=False)
         return
 
-    # Otherwise, fill start time (D=4) and start coords (E=5)
-    sheet.update_cell(target_row, 4, shift_info.get("start_time", "-"))
-    sheet.update_cell(target_row, 5, shift_info.get("start_coords", "-"))
+    # Otherwise, fill start time (D=4) and start coords (E=5) in one call
+    sheet.update(f"D{target_row}:E{target_row}", [[
+        shift_info.get("start_time", "-"),
+        shift_info.get("start_coords", "-"),
+    ]], raw=False)
+
+
+@profiler.trace()
+def update_day_cells(sheet, header_row, first_col, values):
+    """
+    Write `values` into the current day's row of a worker block,
+    starting at column `first_col` (1-based), in one request.
+    """
+    now = datetime.datetime.now(ZoneInfo("Europe/Brussels"))
+    target_row = header_row + now.day
+    start = gspread.utils.rowcol_to_a1(target_row, first_col)
+    end = gspread.utils.rowcol_to_a1(target_row, first_col + len(values) - 1)
+    sheet.update(f"{start}:{end}", [list(values)], raw=False)
+
+@profiler.trace()
+def mark_no_shift_rows(sheet, header_rows):
+    """
+    Fill columns D..I with '-' for the current day in every given worker block,
+    using a single values batchUpdate request for the whole sheet.
+    """
+    if not header_rows:
+        return
+    now = datetime.datetime.now(ZoneInfo("Europe/Brussels"))
+    data = []
+    for header_row in header_rows:
+        target_row = header_row + now.day
+        data.append({'range': f"D{target_row}:I{target_row}", 'values': [["-"] * 6]})
+    sheet.batch_update(data, raw=False)
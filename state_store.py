@@ -0,0 +1,110 @@
+import json
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+
+class SqliteStore:
+    """
+    Local state shared by all bot processes on one machine.
+
+    One SQLite file in WAL mode (readers never block the writer); every
+    process / thread opens its own connection. Data is exposed as dict-like
+    namespaces, see `mapping`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " PRIMARY KEY (ns, key)) WITHOUT ROWID"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None => autocommit, explicit BEGIN for bulk writes
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def mapping(self, namespace: str) -> "SqliteMapping":
+        return SqliteMapping(self, namespace)
+
+
+class SqliteMapping(MutableMapping):
+    """
+    dict-like view of one namespace. Keys and values are stored as JSON, so
+    int user ids stay ints. Values are copies: change nested data by assigning
+    the whole value again.
+    """
+
+    def __init__(self, store: SqliteStore, namespace: str):
+        self.store = store
+        self.namespace = namespace
+
+    def __getitem__(self, key):
+        row = self.store._conn().execute(
+            "SELECT value FROM kv WHERE ns = ? AND key = ?", (self.namespace, json.dumps(key))
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key, value):
+        self.store._conn().execute(
+            "INSERT OR REPLACE INTO kv (ns, key, value) VALUES (?, ?, ?)",
+            (self.namespace, json.dumps(key), json.dumps(value, ensure_ascii=False)),
+        )
+
+    def __delitem__(self, key):
+        cursor = self.store._conn().execute(
+            "DELETE FROM kv WHERE ns = ? AND key = ?", (self.namespace, json.dumps(key))
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.store._conn().execute(
+            "SELECT 1 FROM kv WHERE ns = ? AND key = ?", (self.namespace, json.dumps(key))
+        ).fetchone() is not None
+
+    def __iter__(self):
+        rows = self.store._conn().execute(
+            "SELECT key FROM kv WHERE ns = ?", (self.namespace,)
+        ).fetchall()
+        return (json.loads(row[0]) for row in rows)
+
+    def __len__(self):
+        return self.store._conn().execute(
+            "SELECT COUNT(*) FROM kv WHERE ns = ?", (self.namespace,)
+        ).fetchone()[0]
+
+    def items(self):
+        rows = self.store._conn().execute(
+            "SELECT key, value FROM kv WHERE ns = ?", (self.namespace,)
+        ).fetchall()
+        return [(json.loads(key), json.loads(value)) for key, value in rows]
+
+    def update(self, other=(), **kwargs):
+        """Bulk upsert in a single transaction."""
+        pairs = list(dict(other, **kwargs).items())
+        conn = self.store._conn()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO kv (ns, key, value) VALUES (?, ?, ?)",
+                [(self.namespace, json.dumps(k), json.dumps(v, ensure_ascii=False)) for k, v in pairs],
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def clear(self):
+        self.store._conn().execute("DELETE FROM kv WHERE ns = ?", (self.namespace,))